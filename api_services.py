@@ -1,15 +1,30 @@
 import asyncio
+import time
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
 from telegram.ext import ContextTypes
 from user_models import UserModel
-from hh import HHApi
 from config import base_config
+from db import (
+    enqueue_response_job,
+    create_broadcast,
+    load_unfinished_broadcast,
+    load_user_stats,
+    save_run_checkpoint,
+    delete_run_checkpoint,
+    touch_run_checkpoints,
+    claim_resumable_run_checkpoints,
+)
+from tiers import get_tier, run_queue
+from run_stats import RunStats
+from run_registry import run_registry
 from message_builders import (
     build_main_menu,
     build_settings_menu,
     build_main_menu_back_button,
     build_settings_back_button,
+    build_broadcast_confirm_menu,
     display_about_message,
+    display_statistics_message,
     display_current_settings_message,
     display_resume_selection_message,
     generate_cover_letter,
@@ -20,6 +35,16 @@ STATE_SET_KEYWORDS = 1
 STATE_SET_COVER_LETTER = 2
 STATE_ENTERING_PHONE = 3
 
+# Результат запуска, остановленного для перезапуска бота
+RUN_INTERRUPTED = 'interrupted'
+# Как часто продлевать аренду своих запусков и искать прерванные, в секундах
+CHECKPOINT_POLL_INTERVAL = 30
+# Сколько ждать сохранения контрольной точки при отмене запуска, в секундах
+INTERRUPT_SAVE_TIMEOUT = 5
+
+# Задача текущей рассылки, одновременно выполняется только одна
+broadcast_task = None
+
 async def update_message_in_task(query: CallbackQuery, text: str, reply_markup: InlineKeyboardMarkup = None, parse_mode=None, disable_web_page_preview=None) -> None:
     """Асинхронно редактирует сообщение без блокировки основного цикла событий."""
     asyncio.create_task(query.edit_message_text(
@@ -30,12 +55,84 @@ async def update_message_in_task(query: CallbackQuery, text: str, reply_markup:
     ))
     await asyncio.sleep(0)
 
+class ChatMessage:
+    """Заменяет CallbackQuery вне обработчика обновлений: редактирует сообщение по chat_id и message_id."""
+
+    def __init__(self, bot, chat_id: int, message_id: int):
+        self.bot = bot
+        self.chat_id = int(chat_id)
+        self.message_id = int(message_id)
+
+    async def edit_message_text(self, text: str, reply_markup: InlineKeyboardMarkup = None, parse_mode=None, disable_web_page_preview=None):
+        """Редактирует сообщение с прогрессом откликов."""
+        return await self.bot.edit_message_text(
+            text,
+            chat_id=self.chat_id,
+            message_id=self.message_id,
+            reply_markup=reply_markup,
+            parse_mode=parse_mode,
+            disable_web_page_preview=disable_web_page_preview
+        )
+
+
+async def resume_vacancy_responses(bot, checkpoint: dict) -> None:
+    """Продолжает запуск откликов, прерванный перезапуском бота."""
+    user = UserModel(checkpoint['chat_id'])
+    await user.load(use_cache=False)
+    run_registry.start(
+        user.chat_id,
+        run_vacancy_responses_in_queue(
+            ChatMessage(bot, user.chat_id, checkpoint['message_id']),
+            None,
+            chat_id=user.chat_id,
+            auth_token=user.get("auth_token"),
+            resume_id=user.get("resume_id"),
+            keywords=user.get('keywords'),
+            cover_letter_template=user.get('cover_letter_template'),
+            subscription_level=user.get('subscription_level'),
+            checkpoint=checkpoint,
+        )
+    )
+
+
+async def watch_run_checkpoints(bot) -> None:
+    """Продлевает аренду своих запусков и продолжает прерванные, пока бот принимает запуски.
+
+    При поэтапном деплое старый процесс еще работает, когда стартует новый, поэтому новый
+    продолжает только запуски со статусом 'interrupted' или с истекшей арендой.
+    """
+    while run_registry.accepting:
+        try:
+            if run_registry.runs:
+                await touch_run_checkpoints(list(run_registry.runs))
+            for checkpoint in await claim_resumable_run_checkpoints():
+                if run_registry.is_running(checkpoint['chat_id']):
+                    continue
+                try:
+                    await resume_vacancy_responses(bot, checkpoint)
+                except Exception as e:
+                    print(e, 'error in resuming run', checkpoint['chat_id'])
+        except Exception as e:
+            print(e, 'error in watching run checkpoints')
+        await asyncio.sleep(CHECKPOINT_POLL_INTERVAL)
+
+
+def get_message_id(query) -> int:
+    """Возвращает id сообщения с прогрессом откликов для CallbackQuery и ChatMessage."""
+    if isinstance(query, ChatMessage):
+        return query.message_id
+    return query.message.message_id
+
 
 async def handle_start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Обрабатывает команду /start."""
     chat_id = update.message.chat_id
     user = UserModel(chat_id)
     await user.load()
+    if user.get('is_blocked'):
+        # Пользователь снова написал боту, значит разблокировал его
+        user.set('is_blocked', False)
+        await user.save()
     auth_token_exists = "auth_token" in user.config
     reply_markup = build_main_menu(auth_token_exists)
     await update.message.reply_text(
@@ -45,6 +142,67 @@ async def handle_start_command(update: Update, context: ContextTypes.DEFAULT_TYP
         reply_markup=reply_markup
     )
 
+async def handle_broadcast_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Обрабатывает команду /broadcast <текст> от владельца бота и просит подтвердить рассылку."""
+    if update.message.chat_id != base_config.getOwnerChatId():
+        return
+    # split без разделителя режет по любым пробелам, включая перевод строки после команды
+    text = ''.join(update.message.text.split(maxsplit=1)[1:]).strip()
+    if not text:
+        await update.message.reply_text("Использование: /broadcast <текст сообщения>")
+        return
+    context.user_data['pending_broadcast'] = text
+    await update.message.reply_text(text)
+    await update.message.reply_text(
+        "☝️ Так сообщение увидят пользователи. Отправить рассылку?",
+        reply_markup=build_broadcast_confirm_menu()
+    )
+
+async def confirm_broadcast(query: CallbackQuery, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Запускает подтвержденную владельцем рассылку."""
+    text = context.user_data.pop('pending_broadcast', None)
+    if not text:
+        await update_message_in_task(query, "Нет рассылки для подтверждения. Используйте /broadcast <текст сообщения>")
+        return
+    if is_broadcast_running():
+        await update_message_in_task(query, "⏳ Рассылка уже выполняется.")
+        return
+    await query.edit_message_text("📣 Начинаем рассылку...")
+    broadcast = await create_broadcast(text, query.message.chat_id, query.message.message_id)
+    start_broadcast_task(context, broadcast)
+
+async def cancel_broadcast(query: CallbackQuery, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Отменяет неподтвержденную рассылку."""
+    context.user_data.pop('pending_broadcast', None)
+    await update_message_in_task(query, "❌ Рассылка отменена.")
+
+async def handle_broadcast_resume_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Продолжает прерванную рассылку по команде /broadcast_resume."""
+    if update.message.chat_id != base_config.getOwnerChatId():
+        return
+    if is_broadcast_running():
+        await update.message.reply_text("⏳ Рассылка уже выполняется.")
+        return
+    broadcast = await load_unfinished_broadcast()
+    if not broadcast:
+        await update.message.reply_text("Незавершенных рассылок нет.")
+        return
+    report_message = await update.message.reply_text(f"📣 Продолжаем рассылку #{broadcast['id']}...")
+    broadcast['report_chat_id'] = report_message.chat_id
+    broadcast['report_message_id'] = report_message.message_id
+    start_broadcast_task(context, broadcast)
+
+def is_broadcast_running() -> bool:
+    """Проверяет, выполняется ли рассылка в этом процессе."""
+    return broadcast_task is not None and not broadcast_task.done()
+
+def start_broadcast_task(context: ContextTypes.DEFAULT_TYPE, broadcast: dict) -> None:
+    """Запускает рассылку в отдельной задаче."""
+    # Модуль рассылки нужен только владельцу, импортируем при первом запуске
+    from broadcast import run_broadcast
+    global broadcast_task
+    broadcast_task = asyncio.create_task(run_broadcast(context.bot, broadcast))
+
 async def handle_callback_query(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Обрабатывает нажатия кнопок в встроенных клавиатурах."""
     query = update.callback_query
@@ -64,6 +222,9 @@ async def handle_callback_query(update: Update, context: ContextTypes.DEFAULT_TY
     elif data == 'start_vacancy_responses':
         asyncio.create_task(process_vacancy_responses(query, context, user))
         await asyncio.sleep(0)
+    elif data == 'statistics':
+        stats = await load_user_stats(chat_id)
+        await update_message_in_task(query, *display_statistics_message(stats), parse_mode="Markdown")
     elif data == 'view_settings':
         await update_message_in_task(query, *display_current_settings_message(user))
     elif data == 'settings':
@@ -79,6 +240,11 @@ async def handle_callback_query(update: Update, context: ContextTypes.DEFAULT_TY
         await set_cover_letter(query, context)
     elif data == 'main_menu':
         await go_to_main_menu(query, auth_token)
+    elif data in ('confirm_broadcast', 'cancel_broadcast') and chat_id == base_config.getOwnerChatId():
+        if data == 'confirm_broadcast':
+            await confirm_broadcast(query, context)
+        else:
+            await cancel_broadcast(query, context)
     await query.answer()
 
 async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -150,19 +316,76 @@ async def process_vacancy_responses(query: CallbackQuery, context: ContextTypes.
     cover_letter_template = user.get('cover_letter_template')
     subscription_level = user.get('subscription_level')
 
+    tier = get_tier(subscription_level)
+
+    worker_shards = base_config.getWorkerShards()
+    if worker_shards > 0:
+        # Отклики выполняют отдельные процессы-воркеры (worker.py)
+        job_id = await enqueue_response_job(user.chat_id, query.message.message_id, worker_shards, tier.priority)
+        if job_id is None:
+            await update_message_in_task(query, "⏳ Отклики уже выполняются, дождитесь завершения.", build_main_menu_back_button())
+        else:
+            await update_message_in_task(query, "🕓 Заявка на отклики принята, скоро начнем...")
+        return
+
+    if not run_registry.accepting:
+        await update_message_in_task(query, "🔄 Бот обновляется. Повторите попытку через минуту.", build_main_menu_back_button())
+        return
+    if run_registry.is_running(user.chat_id):
+        await update_message_in_task(query, "⏳ Отклики уже выполняются, дождитесь завершения.", build_main_menu_back_button())
+        return
+
     # Запускаем процесс отклика в отдельной задаче
-    asyncio.create_task(
-        begin_vacancy_responses(
+    run_registry.start(
+        user.chat_id,
+        run_vacancy_responses_in_queue(
             query,
             context,
+            chat_id=user.chat_id,
             auth_token=auth_token,
             resume_id=resume_id,
             keywords=keywords,
             cover_letter_template=cover_letter_template,
+            subscription_level=subscription_level,
         )
     )
     await asyncio.sleep(0)
 
+async def run_vacancy_responses_in_queue(query: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, chat_id, subscription_level=None, checkpoint=None, **kwargs):
+    """Запускает отклики, когда освободится слот; при нагрузке платные уровни проходят раньше."""
+    tier = get_tier(subscription_level)
+    if run_queue.is_full():
+        if checkpoint is None:
+            # Запуск из очереди тоже продолжится, если бот перезапустится раньше
+            await save_run_checkpoint(chat_id, get_message_id(query))
+        await update_message_in_task(query, "🕓 Сейчас много запросов, вы в очереди. Отклики начнутся автоматически...")
+    async with run_queue.slot(tier.priority):
+        if run_registry.stop_requested:
+            # Бот останавливается, пока запуск ждал слота: начнем его после перезапуска
+            checkpoint = checkpoint or {}
+            return await save_interrupted_run(
+                query,
+                chat_id,
+                RunStats(chat_id, checkpoint.get('run_id')),
+                checkpoint.get('page', 0),
+                checkpoint.get('success_counter', 0),
+                checkpoint.get('remaining_responses')
+            )
+        return await begin_vacancy_responses(query, context, chat_id=chat_id, subscription_level=subscription_level, checkpoint=checkpoint, **kwargs)
+
+async def save_interrupted_run(query: CallbackQuery, chat_id, stats: RunStats, page=0, success_counter=0, remaining_responses=None) -> str:
+    """Сохраняет прерванный запуск, чтобы продолжить его после перезапуска, и предупреждает пользователя."""
+    # Продолжение допишет итоги в ту же запись запуска, поэтому запуск не посчитается дважды
+    run_id = await stats.save()
+    await save_run_checkpoint(chat_id, get_message_id(query), page, success_counter, remaining_responses, status='interrupted', run_id=run_id)
+    progress_text = f"\nОткликов: {success_counter} / {remaining_responses}" if remaining_responses is not None else ""
+    try:
+        # Ждем отправки: после остановки бота фоновые задачи уже не выполнятся
+        await query.edit_message_text(f"🔄 Бот обновляется. Отклики продолжатся автоматически через минуту...{progress_text}")
+    except Exception as edit_error:
+        print(f"Ошибка редактирования текста сообщения: {edit_error}")
+    return RUN_INTERRUPTED
+
 
 async def select_resume(query: CallbackQuery, data: str, user: UserModel):
     """Позволяет выбрать резюме для отклика."""
@@ -224,12 +447,18 @@ async def reset_state_with_message(update: Update, context: ContextTypes.DEFAULT
 async def begin_vacancy_responses(
     query: CallbackQuery,
     context: ContextTypes.DEFAULT_TYPE,
+    chat_id,
     auth_token,
     resume_id,
     keywords,
     cover_letter_template,
-) -> bool:
-    """Запускает процесс отклика на вакансии."""
+    subscription_level=None,
+    checkpoint=None,
+):
+    """Запускает процесс отклика на вакансии. С checkpoint продолжает прерванный запуск.
+
+    Возвращает True, если отклики отправлены, RUN_INTERRUPTED при остановке бота, иначе False или None.
+    """
     missing_parameters = []
     if not resume_id:
         missing_parameters.append("📄 Установить резюме")
@@ -255,72 +484,107 @@ async def begin_vacancy_responses(
             "\n\nПожалуйста, установите недостающие параметры с помощью кнопок ниже:",
             reply_markup
         )
+        await delete_run_checkpoint(chat_id)
         return False
 
+    # hh.py тянет cryptography, pytz и декодеры JSON, поэтому импортируется при первом запуске откликов
+    from hh import HHApi
+    tier = get_tier(subscription_level)
     hhApi = HHApi(auth_token)
-    success_counter = 0
+    checkpoint = checkpoint or {}
+    stats = RunStats(chat_id, checkpoint.get('run_id'))
+    message_id = get_message_id(query)
+    success_counter = checkpoint.get('success_counter', 0)
+    remaining_responses = checkpoint.get('remaining_responses')
+    page = checkpoint.get('page', 0)
     is_vacancies_ended = False
+    is_interrupted = False
     total_counter = 0
     successful_responses_counter = 0
     try:
-        await update_message_in_task(query, "🔄 Получаем вакансии...")
-        remaining_responses, next_available_time = await hhApi.count_remaining_responses()
-        is_today_limit = remaining_responses <= 0
-        if is_today_limit:
+        if remaining_responses is None:
+            await update_message_in_task(query, "🔄 Получаем вакансии...")
+            remaining_responses, next_available_time = await hhApi.count_remaining_responses(max_daily_responses=tier.daily_responses)
+            is_today_limit = remaining_responses <= 0
+            if is_today_limit:
+                await update_message_in_task(
+                    query,
+                    f"⛔ На сегодня вы достигли лимита откликов 🙁\n\nСледующий отклик станет доступен: {next_available_time}.",
+                    build_main_menu_back_button()
+                )
+                return False
             await update_message_in_task(
                 query,
-                f"⛔ На сегодня вы достигли лимита откликов 🙁\n\nСледующий отклик станет доступен: {next_available_time}.",
-                build_main_menu_back_button()
+                f"⏳ Доступно {remaining_responses} откликов. Начинаем откликаться..."
             )
-            return False
-        await update_message_in_task(
-            query,
-            f"⏳ Доступно {remaining_responses} откликов. Начинаем откликаться..."
-        )
-        page = 0
+        else:
+            is_today_limit = success_counter >= remaining_responses
+            await update_message_in_task(
+                query,
+                f"🔄 Продолжаем отклики после обновления бота...\nОткликов: {success_counter} / {remaining_responses}"
+            )
+        await save_run_checkpoint(chat_id, message_id, page, success_counter, remaining_responses, run_id=stats.run_id)
         while not is_today_limit and not is_vacancies_ended:
+            if run_registry.stop_requested:
+                is_interrupted = True
+                break
             try:
                 vacancies_list = await hhApi.get_vacancies(keywords, page=page)
                 if not vacancies_list:
                     is_vacancies_ended = True
                     break
-                page += 1
+                candidates = []
                 for vacancy in vacancies_list:
                     try:
                         if vacancy.get('has_test', False):
                             await hhApi.add_vacancy_to_blacklist(vacancy['id'])
+                            stats.record(vacancy['id'], 'test_required')
                             continue
                         if vacancy.get('relations') and len(vacancy['relations']) > 0:
+                            stats.record(vacancy['id'], 'already_applied')
                             continue
-                        total_counter += 1
-                        cover_letter = generate_cover_letter(vacancy['employer']['name'], vacancy['name'], cover_letter_template)
-                        status = await hhApi.respond_to_vacancy(
-                            vacancy_id=vacancy['id'],
-                            resume_id=resume_id,
-                            cover_letter=cover_letter
-                        )
+                        candidates.append(vacancy)
+                    except Exception as edit_error:
+                        print(f"Ошибка откликов: {edit_error}")
+                        continue
+                # Откликаемся пачками, размер пачки зависит от уровня подписки
+                for start in range(0, len(candidates), tier.max_concurrency):
+                    if run_registry.stop_requested:
+                        # Страница будет обработана заново: уже отправленные отклики HH вернет в relations
+                        is_interrupted = True
+                        break
+                    batch = candidates[start:start + tier.max_concurrency][:remaining_responses - success_counter]
+                    total_counter += len(batch)
+                    results = await asyncio.gather(*(
+                        respond_with_timing(hhApi, vacancy, resume_id, cover_letter_template)
+                        for vacancy in batch
+                    ))
+                    for vacancy, (status, elapsed) in zip(batch, results):
+                        stats.record(vacancy['id'], status, elapsed)
                         if status == 'today_limit':
                             is_today_limit = True
-                            break
                         elif status == 'success':
                             success_counter += 1
                             successful_responses_counter += 1
-                        new_status_text = f"⏳ Обработка вакансий...\nОткликов: {success_counter} / {remaining_responses}"
-                        if successful_responses_counter >= 4:
-                            try:
-                                await update_message_in_task(query, new_status_text)
-                                successful_responses_counter = 0
-                            except Exception as edit_error:
-                                print(f"Ошибка редактирования текста сообщения: {edit_error}")
-                                continue
-                        if success_counter >= remaining_responses:
-                            is_today_limit = True
-                            break
-                    except Exception as edit_error:
-                        print(f"Ошибка откликов: {edit_error}")
-                        continue
+                    new_status_text = f"⏳ Обработка вакансий...\nОткликов: {success_counter} / {remaining_responses}"
+                    if successful_responses_counter >= 4:
+                        try:
+                            await update_message_in_task(query, new_status_text)
+                            successful_responses_counter = 0
+                        except Exception as edit_error:
+                            print(f"Ошибка редактирования текста сообщения: {edit_error}")
+                    if success_counter >= remaining_responses:
+                        is_today_limit = True
+                    if is_today_limit:
+                        break
+                if is_interrupted:
+                    break
             except Exception as edit_error:
                 print(edit_error, 'error in vacancies processing')
+            page += 1
+            await save_run_checkpoint(chat_id, message_id, page, success_counter, remaining_responses, run_id=stats.run_id)
+        if is_interrupted:
+            return await save_interrupted_run(query, chat_id, stats, page, success_counter, remaining_responses)
         if success_counter >= 1:
             base_message = f"✅ Успешно отправлено {success_counter} откликов из {remaining_responses}."
             reply_markup = build_main_menu_back_button()
@@ -350,3 +614,35 @@ async def begin_vacancy_responses(
             "❌ Извините, что-то пошло не так. Повторите попытку позже",
             build_main_menu_back_button()
         )
+    except asyncio.CancelledError:
+        # Запуск не успел остановиться сам: отмечаем его прерванным, защищая сохранение от повторной отмены
+        is_interrupted = True
+        try:
+            await asyncio.wait_for(
+                asyncio.shield(save_interrupted_run(query, chat_id, stats, page, success_counter, remaining_responses)),
+                timeout=INTERRUPT_SAVE_TIMEOUT
+            )
+        except (Exception, asyncio.CancelledError) as e:
+            # Без отметки запуск все равно продолжится после истечения аренды контрольной точки
+            print(e, 'error in saving interrupted run', chat_id)
+        raise
+    finally:
+        # Прерванный запуск уже сохранил итоги вместе с контрольной точкой в save_interrupted_run
+        if not is_interrupted:
+            await stats.save()
+            await delete_run_checkpoint(chat_id)
+
+async def respond_with_timing(hhApi, vacancy: dict, resume_id, cover_letter_template):
+    """Откликается на вакансию и возвращает статус вместе со временем запроса в секундах."""
+    started = time.monotonic()
+    try:
+        cover_letter = generate_cover_letter(vacancy['employer']['name'], vacancy['name'], cover_letter_template)
+        status = await hhApi.respond_to_vacancy(
+            vacancy_id=vacancy['id'],
+            resume_id=resume_id,
+            cover_letter=cover_letter
+        )
+    except Exception as e:
+        print(f"Ошибка откликов: {e}")
+        status = 'error'
+    return status, time.monotonic() - started
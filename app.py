@@ -1,11 +1,61 @@
+import asyncio
+import os
+import subprocess
+import sys
 from telegram.ext import Application
 from config import base_config
+from db import create_tables
 from bot_handlers import register_handlers
+from api_services import watch_run_checkpoints
+from run_registry import run_registry
+
+# Фоновая задача, которая продолжает прерванные запуски откликов
+checkpoints_watcher = None
+
+async def on_startup(application: Application) -> None:
+    """Подготавливает базу данных и начинает продолжать прерванные запуски откликов."""
+    global checkpoints_watcher
+    await create_tables()
+    if base_config.getWorkerShards() > 0:
+        # Прерванные задачи продолжают воркеры
+        return
+    checkpoints_watcher = asyncio.create_task(watch_run_checkpoints(application.bot))
+
+async def on_stop(application: Application) -> None:
+    """Останавливает активные запуски откликов, сохраняя их прогресс."""
+    if checkpoints_watcher is not None:
+        checkpoints_watcher.cancel()
+    await run_registry.drain(base_config.getShutdownTimeout())
+
+def profile_startup(limit: int = 25) -> None:
+    """Печатает разбивку времени импорта модулей при запуске бота (python app.py --profile-startup)."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import app'],
+        capture_output=True,
+        text=True,
+        cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        parts = line.split('|')
+        if not line.startswith('import time:') or len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        self_us = int(parts[0].split(':')[1])
+        cumulative_us = int(parts[1])
+        rows.append((cumulative_us, self_us, parts[2].rstrip()))
+    if not rows:
+        print(result.stderr)
+        return
+    total_us = max(cumulative_us for cumulative_us, _, _ in rows)
+    print(f"Total import time: {total_us / 1000:.1f} ms")
+    print(f"{'cumulative, ms':>15} {'self, ms':>10}  module")
+    for cumulative_us, self_us, module in sorted(rows, reverse=True)[:limit]:
+        print(f"{cumulative_us / 1000:>15.1f} {self_us / 1000:>10.1f} {module}")
 
 def main() -> None:
     """Основная функция для запуска бота."""
     TOKEN = base_config.getBotToken()
-    application = Application.builder().token(TOKEN).build()
+    application = Application.builder().token(TOKEN).post_init(on_startup).post_stop(on_stop).build()
 
     # Регистрация обработчиков из контроллеров
     register_handlers(application)
@@ -13,4 +63,7 @@ def main() -> None:
     application.run_polling()
 
 if __name__ == '__main__':
-    main()
+    if '--profile-startup' in sys.argv:
+        profile_startup()
+    else:
+        main()
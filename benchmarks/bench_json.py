@@ -0,0 +1,86 @@
+"""Микробенчмарк разбора ответов HH API.
+
+Сравнивает время разбора и пиковую память на страницу для json.loads
+(как было через response.json()) и для декодеров из hh_json.
+
+Запуск из корня проекта:
+    python benchmarks/bench_json.py
+"""
+import json
+import os
+import sys
+import timeit
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import hh_json
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+FIXTURES = {
+    'vacancies.json': hh_json.VacanciesPage,
+    'negotiations.json': hh_json.NegotiationsPage,
+    'resumes.json': hh_json.ResumesPage,
+}
+
+def stdlib_decode(content, schema):
+    return json.loads(content).get('items', [])
+
+def fallback_decode(content, schema):
+    # Вызывается внутри without_optional_decoders: hh_json идет по пути без msgspec и orjson
+    return hh_json.decode_items(content, schema)
+
+@contextmanager
+def without_optional_decoders():
+    """Временно отключает msgspec и orjson в hh_json, как будто они не установлены."""
+    saved = hh_json.msgspec, hh_json.orjson
+    hh_json.msgspec, hh_json.orjson = None, None
+    try:
+        yield
+    finally:
+        hh_json.msgspec, hh_json.orjson = saved
+
+def orjson_decode(content, schema):
+    return hh_json.orjson.loads(content).get('items', [])
+
+def msgspec_decode(content, schema):
+    return hh_json._decoders[schema].decode(content).get('items', [])
+
+def available_decoders():
+    decoders = [('json (до)', stdlib_decode, nullcontext), ('json (fallback)', fallback_decode, without_optional_decoders)]
+    if hh_json.orjson is not None:
+        decoders.append(('orjson', orjson_decode, nullcontext))
+    if hh_json.msgspec is not None:
+        decoders.append(('msgspec + схема', msgspec_decode, nullcontext))
+    return decoders
+
+def measure_time(decode, content, schema, number):
+    timer = timeit.Timer(lambda: decode(content, schema))
+    return min(timer.repeat(repeat=5, number=number)) / number
+
+def measure_peak_memory(decode, content, schema):
+    tracemalloc.start()
+    try:
+        # Результат удерживаем до снятия пика, как это делает бот при обработке страницы
+        result = decode(content, schema)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return peak
+
+def main():
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    print(f"{'Фикстура':<20} {'Декодер':<18} {'Время, мкс':>12} {'Пик памяти, КБ':>16}")
+    for filename, schema in FIXTURES.items():
+        with open(os.path.join(FIXTURES_DIR, filename), 'rb') as f:
+            content = f.read()
+        for name, decode, context in available_decoders():
+            with context():
+                elapsed = measure_time(decode, content, schema, number)
+                peak = measure_peak_memory(decode, content, schema)
+            print(f"{filename:<20} {name:<18} {elapsed * 1e6:>12.1f} {peak / 1024:>16.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -8,6 +8,8 @@ from telegram.ext import (
 
 from api_services import (
     handle_start_command,
+    handle_broadcast_command,
+    handle_broadcast_resume_command,
     handle_callback_query,
     handle_text_message,
 )
@@ -15,5 +17,7 @@ from api_services import (
 def register_handlers(application: Application) -> None:
     """Регистрирует обработчики команд и сообщений."""
     application.add_handler(CommandHandler("start", handle_start_command))
+    application.add_handler(CommandHandler("broadcast", handle_broadcast_command))
+    application.add_handler(CommandHandler("broadcast_resume", handle_broadcast_resume_command))
     application.add_handler(CallbackQueryHandler(handle_callback_query))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text_message))
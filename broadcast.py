@@ -0,0 +1,171 @@
+import asyncio
+import time
+from telegram import Bot
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TelegramError, TimedOut
+from db import iter_broadcast_chat_ids, mark_user_blocked, save_broadcast_progress
+
+# Лимиты Telegram: около 30 сообщений в секунду на бота и 1 сообщение в секунду в один чат
+GLOBAL_RATE = 25
+PER_CHAT_INTERVAL = 1.0
+# Сколько получателей отправляется параллельно между сохранениями прогресса
+BATCH_SIZE = 50
+MAX_ATTEMPTS = 3
+PROGRESS_INTERVAL = 5
+
+class TokenBucket:
+    """Ведро токенов: пропускает не больше rate операций в секунду с запасом capacity."""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """Ожидает свободный токен."""
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, delay: float) -> None:
+        """Останавливает выдачу токенов, когда Telegram просит подождать (flood control)."""
+        self.paused_until = max(self.paused_until, time.monotonic() + delay)
+        self.tokens = 0
+
+
+class RateLimiter:
+    """Соблюдает общий лимит бота и лимит на один чат."""
+
+    def __init__(self, rate: float = GLOBAL_RATE, per_chat_interval: float = PER_CHAT_INTERVAL):
+        self.bucket = TokenBucket(rate)
+        self.per_chat_interval = per_chat_interval
+        self.chat_sent_at = {}
+
+    async def acquire(self, chat_id: int) -> None:
+        """Ожидает, пока можно отправить сообщение в чат."""
+        wait = self.chat_sent_at.get(chat_id, 0.0) + self.per_chat_interval - time.monotonic()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        await self.bucket.acquire()
+        self.chat_sent_at[chat_id] = time.monotonic()
+        if len(self.chat_sent_at) > 10000:
+            self.forget_idle_chats()
+
+    def forget_idle_chats(self) -> None:
+        """Удаляет чаты, для которых лимит уже не действует."""
+        threshold = time.monotonic() - self.per_chat_interval
+        self.chat_sent_at = {chat_id: sent_at for chat_id, sent_at in self.chat_sent_at.items() if sent_at > threshold}
+
+
+notification_limiter = RateLimiter()
+
+def get_retry_delay(error: RetryAfter) -> float:
+    """Возвращает паузу из ошибки RetryAfter в секундах."""
+    retry_after = error.retry_after
+    if hasattr(retry_after, 'total_seconds'):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+async def send_notification(bot: Bot, chat_id: int, text: str, limiter: RateLimiter = notification_limiter, **kwargs) -> str:
+    """Отправляет сообщение с учетом лимитов Telegram. Возвращает 'sent', 'blocked' или 'failed'."""
+    attempt = 0
+    while attempt < MAX_ATTEMPTS:
+        await limiter.acquire(chat_id)
+        try:
+            await bot.send_message(chat_id, text, **kwargs)
+            return 'sent'
+        except RetryAfter as e:
+            # Flood control не считается неудачной попыткой: ждем и отправляем снова
+            limiter.bucket.pause(get_retry_delay(e))
+        except Forbidden:
+            try:
+                await mark_user_blocked(chat_id)
+            except Exception as e:
+                print(e, 'error in mark_user_blocked', chat_id)
+            return 'blocked'
+        except BadRequest as e:
+            print(f"Failed to send notification to {chat_id}: {e}")
+            return 'failed'
+        except TimedOut as e:
+            # Сообщение могло дойти, повтор отправил бы его второй раз
+            print(f"Timed out while sending notification to {chat_id}: {e}")
+            return 'failed'
+        except NetworkError as e:
+            print(f"Network error while sending notification to {chat_id}: {e}")
+            attempt += 1
+            await asyncio.sleep(2 ** attempt)
+        except TelegramError as e:
+            print(f"Failed to send notification to {chat_id}: {e}")
+            return 'failed'
+    return 'failed'
+
+def format_broadcast_progress(broadcast: dict) -> str:
+    """Возвращает текст прогресса рассылки."""
+    status_text = "✅ Рассылка завершена" if broadcast['status'] == 'done' else "📣 Рассылка выполняется..."
+    return (
+        f"{status_text} (#{broadcast['id']})\n\n"
+        f"📨 Отправлено: {broadcast['sent']}\n"
+        f"🚫 Заблокировали бота: {broadcast['blocked']}\n"
+        f"❌ Ошибок: {broadcast['failed']}"
+    )
+
+async def report_broadcast_progress(bot: Bot, broadcast: dict) -> None:
+    """Обновляет сообщение владельца с прогрессом рассылки."""
+    if not broadcast.get('report_message_id'):
+        return
+    try:
+        await bot.edit_message_text(
+            format_broadcast_progress(broadcast),
+            chat_id=broadcast['report_chat_id'],
+            message_id=broadcast['report_message_id']
+        )
+    except Exception as e:
+        print(f"Ошибка обновления прогресса рассылки: {e}")
+
+async def send_broadcast_batch(bot: Bot, broadcast: dict, chat_ids: list, limiter: RateLimiter) -> None:
+    """Отправляет рассылку пачке получателей и сохраняет прогресс."""
+    results = await asyncio.gather(*(
+        send_notification(bot, chat_id, broadcast['text'], limiter) for chat_id in chat_ids
+    ), return_exceptions=True)
+    for chat_id, result in zip(chat_ids, results):
+        if isinstance(result, Exception):
+            # Ошибка одного получателя не должна терять прогресс всей пачки
+            print(result, 'error in send_notification', chat_id)
+            result = 'failed'
+        broadcast[result] += 1
+    broadcast['last_chat_id'] = chat_ids[-1]
+    await save_broadcast_progress(broadcast)
+
+async def run_broadcast(bot: Bot, broadcast: dict, limiter: RateLimiter = notification_limiter) -> None:
+    """Выполняет рассылку, продолжая с последнего сохраненного получателя."""
+    reported_at = 0.0
+    chat_ids = []
+    try:
+        async for chat_id in iter_broadcast_chat_ids(broadcast['last_chat_id']):
+            chat_ids.append(chat_id)
+            if len(chat_ids) < BATCH_SIZE:
+                continue
+            await send_broadcast_batch(bot, broadcast, chat_ids, limiter)
+            chat_ids = []
+            if time.monotonic() - reported_at >= PROGRESS_INTERVAL:
+                await report_broadcast_progress(bot, broadcast)
+                reported_at = time.monotonic()
+        if chat_ids:
+            await send_broadcast_batch(bot, broadcast, chat_ids, limiter)
+        broadcast['status'] = 'done'
+        await save_broadcast_progress(broadcast)
+    except Exception as e:
+        # Рассылка остается в статусе 'running' и продолжится командой /broadcast_resume
+        print(e, 'error in run_broadcast')
+    await report_broadcast_progress(bot, broadcast)
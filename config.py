@@ -26,6 +26,30 @@ class BaseConfig:
   def getRedirectUri(self):
     return os.getenv('REDIRECT_URI', '')
   
+  def getWorkerShards(self):
+    return int(os.getenv('WORKER_SHARDS', '0'))
+
+  def getWorkerShard(self):
+    return int(os.getenv('WORKER_SHARD', '0'))
+
+  def getWorkerConcurrency(self):
+    return int(os.getenv('WORKER_CONCURRENCY', '10'))
+
+  def getSubscriptionTiers(self):
+    return os.getenv('SUBSCRIPTION_TIERS', '')
+
+  def getMaxActiveRuns(self):
+    return int(os.getenv('MAX_ACTIVE_RUNS', '20'))
+
+  def getRunHistoryDetails(self):
+    return os.getenv('RUN_HISTORY_DETAILS', '0') == '1'
+
+  def getShutdownTimeout(self):
+    return float(os.getenv('SHUTDOWN_TIMEOUT', '20'))
+
+  def getOwnerChatId(self):
+    return int(os.getenv('OWNER_CHAT_ID', '0'))
+
   def getAuthUrl(self, chat_id):
     return f"https://hh.kz/oauth/authorize?response_type=code&client_id={self.getCLientId()}&redirect_uri={self.getRedirectUri()}/&state={chat_id}"
   
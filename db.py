@@ -1,5 +1,6 @@
+import zlib
 import asyncpg
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from config import base_config
 
 DATABASE_URL = base_config.getDatabaseUrl()
@@ -64,3 +65,444 @@ async def find_resume_owner(resume_id):
         return None
     finally:
         await conn.close()
+
+RESPONSE_JOBS_CHANNEL = 'response_jobs'
+# Ключ advisory-блокировки, под которой создаются таблицы
+CREATE_TABLES_LOCK_ID = 0x616E7668
+# Задача в статусе 'running' без отметки воркера дольше этого времени считается брошенной
+RESPONSE_JOB_LEASE = timedelta(minutes=2)
+# Активный запуск, процесс которого не обновлял updated_at дольше этого времени, считается прерванным
+RUN_CHECKPOINT_LEASE = timedelta(minutes=2)
+
+async def create_tables():
+    """Создает служебные таблицы, если они еще не существуют."""
+    conn = await asyncpg.connect(DATABASE_URL)
+    try:
+        # Бот и воркеры стартуют одновременно, а параллельные CREATE IF NOT EXISTS
+        # падают на дубликате ключа в каталоге, поэтому DDL выполняется по очереди
+        async with conn.transaction():
+            await conn.execute("SELECT pg_advisory_xact_lock($1)", CREATE_TABLES_LOCK_ID)
+            await conn.execute("""
+                CREATE TABLE IF NOT EXISTS response_jobs (
+                    id BIGSERIAL PRIMARY KEY,
+                    chat_id BIGINT NOT NULL,
+                    message_id BIGINT NOT NULL,
+                    shard INTEGER NOT NULL,
+                    priority INTEGER NOT NULL DEFAULT 0,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                    started_at TIMESTAMPTZ,
+                    heartbeat_at TIMESTAMPTZ,
+                    finished_at TIMESTAMPTZ
+                );
+                CREATE UNIQUE INDEX IF NOT EXISTS response_jobs_active_chat_idx
+                    ON response_jobs (chat_id) WHERE status IN ('pending', 'running');
+                ALTER TABLE response_jobs ADD COLUMN IF NOT EXISTS priority INTEGER NOT NULL DEFAULT 0;
+                ALTER TABLE response_jobs ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMPTZ;
+                CREATE INDEX IF NOT EXISTS response_jobs_running_idx
+                    ON response_jobs (shard, heartbeat_at) WHERE status = 'running';
+                DROP INDEX IF EXISTS response_jobs_pending_idx;
+                CREATE INDEX IF NOT EXISTS response_jobs_pending_priority_idx
+                    ON response_jobs (shard, priority, id) WHERE status = 'pending';
+
+                ALTER TABLE user_settings ADD COLUMN IF NOT EXISTS is_blocked BOOLEAN NOT NULL DEFAULT FALSE;
+                CREATE TABLE IF NOT EXISTS broadcasts (
+                    id BIGSERIAL PRIMARY KEY,
+                    text TEXT NOT NULL,
+                    report_chat_id BIGINT NOT NULL,
+                    report_message_id BIGINT,
+                    status TEXT NOT NULL DEFAULT 'running',
+                    last_chat_id BIGINT NOT NULL DEFAULT 0,
+                    sent INTEGER NOT NULL DEFAULT 0,
+                    failed INTEGER NOT NULL DEFAULT 0,
+                    blocked INTEGER NOT NULL DEFAULT 0,
+                    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                    finished_at TIMESTAMPTZ
+                );
+
+                CREATE TABLE IF NOT EXISTS response_runs (
+                    id BIGSERIAL PRIMARY KEY,
+                    chat_id BIGINT NOT NULL,
+                    started_at TIMESTAMPTZ NOT NULL,
+                    finished_at TIMESTAMPTZ NOT NULL,
+                    success INTEGER NOT NULL DEFAULT 0,
+                    already_applied INTEGER NOT NULL DEFAULT 0,
+                    test_required INTEGER NOT NULL DEFAULT 0,
+                    forbidden INTEGER NOT NULL DEFAULT 0,
+                    error INTEGER NOT NULL DEFAULT 0,
+                    requests INTEGER NOT NULL DEFAULT 0,
+                    response_time_ms BIGINT NOT NULL DEFAULT 0
+                );
+                CREATE INDEX IF NOT EXISTS response_runs_chat_idx ON response_runs (chat_id, started_at);
+                CREATE TABLE IF NOT EXISTS response_run_details (
+                    run_id BIGINT NOT NULL,
+                    chat_id BIGINT NOT NULL,
+                    vacancy_id TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    elapsed_ms INTEGER,
+                    created_at TIMESTAMPTZ NOT NULL
+                ) PARTITION BY RANGE (created_at);
+                CREATE TABLE IF NOT EXISTS response_stats_daily (
+                    chat_id BIGINT NOT NULL,
+                    day DATE NOT NULL,
+                    runs INTEGER NOT NULL DEFAULT 0,
+                    success INTEGER NOT NULL DEFAULT 0,
+                    already_applied INTEGER NOT NULL DEFAULT 0,
+                    test_required INTEGER NOT NULL DEFAULT 0,
+                    forbidden INTEGER NOT NULL DEFAULT 0,
+                    error INTEGER NOT NULL DEFAULT 0,
+                    requests INTEGER NOT NULL DEFAULT 0,
+                    response_time_ms BIGINT NOT NULL DEFAULT 0,
+                    PRIMARY KEY (chat_id, day)
+                );
+
+                CREATE TABLE IF NOT EXISTS run_checkpoints (
+                    chat_id BIGINT PRIMARY KEY,
+                    message_id BIGINT NOT NULL,
+                    page INTEGER NOT NULL DEFAULT 0,
+                    success_counter INTEGER NOT NULL DEFAULT 0,
+                    remaining_responses INTEGER,
+                    status TEXT NOT NULL DEFAULT 'active',
+                    run_id BIGINT,
+                    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+                );
+                ALTER TABLE run_checkpoints ADD COLUMN IF NOT EXISTS status TEXT NOT NULL DEFAULT 'active';
+                ALTER TABLE run_checkpoints ADD COLUMN IF NOT EXISTS run_id BIGINT;
+                CREATE INDEX IF NOT EXISTS run_checkpoints_status_idx ON run_checkpoints (status, updated_at);
+            """)
+    finally:
+        await conn.close()
+
+def get_shard(chat_id, shards):
+    """Возвращает номер шарда воркера, которому принадлежит пользователь."""
+    return zlib.crc32(str(int(chat_id)).encode()) % shards
+
+async def enqueue_response_job(chat_id, message_id, shards, priority=0):
+    """Ставит задачу откликов в очередь. Возвращает None, если задача пользователя уже в очереди."""
+    chat_id = int(chat_id)
+    shard = get_shard(chat_id, shards)
+    conn = await asyncpg.connect(DATABASE_URL)
+    try:
+        async with conn.transaction():
+            job_id = await conn.fetchval(
+                "INSERT INTO response_jobs (chat_id, message_id, shard, priority) VALUES ($1, $2, $3, $4) "
+                "ON CONFLICT (chat_id) WHERE status IN ('pending', 'running') DO NOTHING "
+                "RETURNING id",
+                chat_id, message_id, shard, priority
+            )
+            if job_id is not None:
+                # Уведомление доставляется воркерам после коммита транзакции
+                await conn.execute("SELECT pg_notify($1, $2)", RESPONSE_JOBS_CHANNEL, str(shard))
+        return job_id
+    finally:
+        await conn.close()
+
+async def claim_response_job(shard):
+    """Забирает следующую задачу шарда с наивысшим приоритетом. Параллельные воркеры пропускают заблокированные строки.
+
+    Задачи упавших воркеров, которые перестали обновлять heartbeat_at, забираются повторно.
+    """
+    conn = await asyncpg.connect(DATABASE_URL)
+    try:
+        result = await conn.fetchrow("""
+            UPDATE response_jobs SET status = 'running', started_at = now(), heartbeat_at = now()
+            WHERE id = (
+                SELECT id FROM response_jobs
+                WHERE shard = $1 AND (
+                    status = 'pending'
+                    OR (status = 'running' AND COALESCE(heartbeat_at, started_at) < now() - $2::interval)
+                )
+                ORDER BY priority, id
+                FOR UPDATE SKIP LOCKED
+                LIMIT 1
+            )
+            RETURNING id, chat_id, message_id
+        """, shard, RESPONSE_JOB_LEASE)
+        return dict(result) if result else None
+    finally:
+        await conn.close()
+
+async def touch_response_jobs(job_ids):
+    """Продлевает аренду задач, которые выполняет воркер."""
+    conn = await asyncpg.connect(DATABASE_URL)
+    try:
+        await conn.execute(
+            "UPDATE response_jobs SET heartbeat_at = now() WHERE id = ANY($1::bigint[]) AND status = 'running'",
+            list(job_ids)
+        )
+    finally:
+        await conn.close()
+
+async def requeue_response_job(job_id):
+    """Возвращает прерванную задачу в очередь, чтобы ее продолжил другой воркер."""
+    conn = await asyncpg.connect(DATABASE_URL)
+    try:
+        async with conn.transaction():
+            shard = await conn.fetchval(
+                "UPDATE response_jobs SET status = 'pending', started_at = NULL, heartbeat_at = NULL WHERE id = $1 RETURNING shard",
+                job_id
+            )
+            if shard is not None:
+                await conn.execute("SELECT pg_notify($1, $2)", RESPONSE_JOBS_CHANNEL, str(shard))
+    finally:
+        await conn.close()
+
+async def finish_response_job(job_id, status):
+    """Отмечает задачу откликов завершенной."""
+    conn = await asyncpg.connect(DATABASE_URL)
+    try:
+        await conn.execute(
+            "UPDATE response_jobs SET status = $1, finished_at = now() WHERE id = $2",
+            status, job_id
+        )
+    finally:
+        await conn.close()
+
+async def iter_broadcast_chat_ids(after_chat_id=0, page_size=500):
+    """Отдает chat_id получателей рассылки страницами по ключу, не загружая всех в память.
+
+    Каждая страница читается отдельным коротким запросом, чтобы долгая рассылка
+    не держала открытую транзакцию и не мешала vacuum.
+    """
+    conn = await asyncpg.connect(DATABASE_URL)
+    try:
+        while True:
+            records = await conn.fetch(
+                "SELECT chat_id FROM user_settings WHERE chat_id > $1 AND NOT is_blocked ORDER BY chat_id LIMIT $2",
+                after_chat_id, page_size
+            )
+            for record in records:
+                yield record['chat_id']
+            if len(records) < page_size:
+                return
+            after_chat_id = records[-1]['chat_id']
+    finally:
+        await conn.close()
+
+async def mark_user_blocked(chat_id):
+    """Отмечает пользователя, заблокировавшего бота."""
+    chat_id = int(chat_id)
+    conn = await asyncpg.connect(DATABASE_URL)
+    try:
+        await conn.execute("UPDATE user_settings SET is_blocked = TRUE WHERE chat_id = $1", chat_id)
+        if chat_id in user_config_cache:
+            del user_config_cache[chat_id]
+    finally:
+        await conn.close()
+
+async def create_broadcast(text, report_chat_id, report_message_id):
+    """Создает рассылку и возвращает ее запись."""
+    conn = await asyncpg.connect(DATABASE_URL)
+    try:
+        result = await conn.fetchrow(
+            "INSERT INTO broadcasts (text, report_chat_id, report_message_id) VALUES ($1, $2, $3) RETURNING *",
+            text, report_chat_id, report_message_id
+        )
+        return dict(result)
+    finally:
+        await conn.close()
+
+async def load_unfinished_broadcast():
+    """Возвращает последнюю незавершенную рассылку."""
+    conn = await asyncpg.connect(DATABASE_URL)
+    try:
+        result = await conn.fetchrow(
+            "SELECT * FROM broadcasts WHERE status = 'running' ORDER BY id DESC LIMIT 1"
+        )
+        return dict(result) if result else None
+    finally:
+        await conn.close()
+
+async def save_broadcast_progress(broadcast):
+    """Сохраняет прогресс рассылки, чтобы ее можно было продолжить после перезапуска."""
+    conn = await asyncpg.connect(DATABASE_URL)
+    try:
+        await conn.execute(
+            "UPDATE broadcasts SET status = $1, last_chat_id = $2, sent = $3, failed = $4, blocked = $5, "
+            "finished_at = CASE WHEN $1 = 'running' THEN NULL ELSE now() END WHERE id = $6",
+            broadcast['status'], broadcast['last_chat_id'], broadcast['sent'],
+            broadcast['failed'], broadcast['blocked'], broadcast['id']
+        )
+    finally:
+        await conn.close()
+
+RUN_OUTCOMES = ('success', 'already_applied', 'test_required', 'forbidden', 'error')
+# Месячные партиции деталей запусков, уже созданные этим процессом
+created_detail_partitions = set()
+
+async def ensure_run_details_partition(conn, month_start):
+    """Создает партицию деталей запусков за месяц (по UTC), если ее еще нет. Возвращает имя партиции или None."""
+    # Границы передаются с явным смещением, чтобы не зависеть от TimeZone сессии
+    next_month_start = (month_start + timedelta(days=32)).replace(day=1)
+    partition_name = f"response_run_details_{month_start:%Y_%m}"
+    if partition_name in created_detail_partitions:
+        return None
+    await conn.execute(
+        f"CREATE TABLE IF NOT EXISTS {partition_name} PARTITION OF response_run_details "
+        f"FOR VALUES FROM ('{month_start.isoformat()} 00:00:00+00') TO ('{next_month_start.isoformat()} 00:00:00+00')"
+    )
+    return partition_name
+
+async def save_run_stats(chat_id, started_at, finished_at, counters, requests, response_time_ms, details=None, run_id=None):
+    """Сохраняет итоги запуска откликов и обновляет дневную сводку пользователя.
+
+    С run_id добавляет итоги к уже сохраненной части продолженного запуска, не считая его новым. Возвращает id запуска.
+    """
+    chat_id = int(chat_id)
+    counter_values = [counters.get(outcome, 0) for outcome in RUN_OUTCOMES]
+    conn = await asyncpg.connect(DATABASE_URL)
+    try:
+        async with conn.transaction():
+            new_run = 0
+            if run_id is not None:
+                run_id = await conn.fetchval("""
+                    UPDATE response_runs SET
+                        finished_at = $2,
+                        success = success + $3,
+                        already_applied = already_applied + $4,
+                        test_required = test_required + $5,
+                        forbidden = forbidden + $6,
+                        error = error + $7,
+                        requests = requests + $8,
+                        response_time_ms = response_time_ms + $9
+                    WHERE id = $1
+                    RETURNING id
+                """, run_id, finished_at, *counter_values, requests, response_time_ms)
+            if run_id is None:
+                new_run = 1
+                run_id = await conn.fetchval(
+                    "INSERT INTO response_runs (chat_id, started_at, finished_at, success, already_applied, "
+                    "test_required, forbidden, error, requests, response_time_ms) "
+                    "VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10) RETURNING id",
+                    chat_id, started_at, finished_at, *counter_values, requests, response_time_ms
+                )
+            await conn.execute("""
+                INSERT INTO response_stats_daily (chat_id, day, runs, success, already_applied,
+                    test_required, forbidden, error, requests, response_time_ms)
+                VALUES ($1, $2, $10, $3, $4, $5, $6, $7, $8, $9)
+                ON CONFLICT (chat_id, day) DO UPDATE SET
+                    runs = response_stats_daily.runs + EXCLUDED.runs,
+                    success = response_stats_daily.success + EXCLUDED.success,
+                    already_applied = response_stats_daily.already_applied + EXCLUDED.already_applied,
+                    test_required = response_stats_daily.test_required + EXCLUDED.test_required,
+                    forbidden = response_stats_daily.forbidden + EXCLUDED.forbidden,
+                    error = response_stats_daily.error + EXCLUDED.error,
+                    requests = response_stats_daily.requests + EXCLUDED.requests,
+                    response_time_ms = response_stats_daily.response_time_ms + EXCLUDED.response_time_ms
+            """, chat_id, started_at.astimezone(timezone.utc).date(), *counter_values, requests, response_time_ms, new_run)
+        if details:
+            # Детали пишутся отдельно: их ошибка не должна откатывать итоги запуска
+            try:
+                new_partitions = []
+                async with conn.transaction():
+                    months = {created_at.astimezone(timezone.utc).date().replace(day=1) for _, _, _, created_at in details}
+                    for month_start in months:
+                        partition_name = await ensure_run_details_partition(conn, month_start)
+                        if partition_name:
+                            new_partitions.append(partition_name)
+                    await conn.copy_records_to_table(
+                        'response_run_details',
+                        records=[(run_id, chat_id, vacancy_id, status, elapsed_ms, created_at)
+                                 for vacancy_id, status, elapsed_ms, created_at in details],
+                        columns=['run_id', 'chat_id', 'vacancy_id', 'status', 'elapsed_ms', 'created_at']
+                    )
+                # Кэшируем только партиции из закоммиченной транзакции: при откате DDL тоже отменяется
+                created_detail_partitions.update(new_partitions)
+            except Exception as e:
+                print(e, 'error in saving run details', run_id)
+        return run_id
+    finally:
+        await conn.close()
+
+async def load_user_stats(chat_id):
+    """Возвращает статистику откликов пользователя из дневных сводок одним запросом. Дни считаются в UTC."""
+    chat_id = int(chat_id)
+    conn = await asyncpg.connect(DATABASE_URL)
+    try:
+        result = await conn.fetchrow("""
+            SELECT
+                COALESCE(SUM(runs), 0)::BIGINT AS runs,
+                COALESCE(SUM(success), 0)::BIGINT AS success,
+                COALESCE(SUM(already_applied), 0)::BIGINT AS already_applied,
+                COALESCE(SUM(test_required), 0)::BIGINT AS test_required,
+                COALESCE(SUM(forbidden), 0)::BIGINT AS forbidden,
+                COALESCE(SUM(error), 0)::BIGINT AS error,
+                COALESCE(SUM(requests), 0)::BIGINT AS requests,
+                COALESCE(SUM(response_time_ms), 0)::BIGINT AS response_time_ms,
+                COALESCE(SUM(success) FILTER (WHERE day = (now() AT TIME ZONE 'UTC')::date), 0)::BIGINT AS today_success,
+                COALESCE(SUM(success) FILTER (WHERE day > (now() AT TIME ZONE 'UTC')::date - 7), 0)::BIGINT AS week_success
+            FROM response_stats_daily
+            WHERE chat_id = $1
+        """, chat_id)
+        return dict(result)
+    finally:
+        await conn.close()
+
+async def save_run_checkpoint(chat_id, message_id, page=0, success_counter=0, remaining_responses=None, status='active', run_id=None):
+    """Сохраняет прогресс запуска откликов, чтобы продолжить его после перезапуска.
+
+    Статус 'active' означает, что запуск выполняется, 'interrupted' — что он остановлен и ждет продолжения.
+    run_id — уже сохраненная статистика запуска, продолжение дописывает итоги в нее.
+    """
+    conn = await asyncpg.connect(DATABASE_URL)
+    try:
+        await conn.execute("""
+            INSERT INTO run_checkpoints (chat_id, message_id, page, success_counter, remaining_responses, status, run_id)
+            VALUES ($1, $2, $3, $4, $5, $6, $7)
+            ON CONFLICT (chat_id) DO UPDATE SET
+                message_id = EXCLUDED.message_id,
+                page = EXCLUDED.page,
+                success_counter = EXCLUDED.success_counter,
+                remaining_responses = EXCLUDED.remaining_responses,
+                status = EXCLUDED.status,
+                run_id = EXCLUDED.run_id,
+                updated_at = now()
+        """, int(chat_id), int(message_id), page, success_counter, remaining_responses, status, run_id)
+    finally:
+        await conn.close()
+
+async def load_run_checkpoint(chat_id):
+    """Возвращает сохраненный прогресс запуска пользователя."""
+    conn = await asyncpg.connect(DATABASE_URL)
+    try:
+        result = await conn.fetchrow("SELECT * FROM run_checkpoints WHERE chat_id = $1", int(chat_id))
+        return dict(result) if result else None
+    finally:
+        await conn.close()
+
+async def touch_run_checkpoints(chat_ids):
+    """Продлевает аренду запусков, которые выполняет этот процесс."""
+    conn = await asyncpg.connect(DATABASE_URL)
+    try:
+        await conn.execute(
+            "UPDATE run_checkpoints SET updated_at = now() WHERE chat_id = ANY($1::bigint[]) AND status = 'active'",
+            [int(chat_id) for chat_id in chat_ids]
+        )
+    finally:
+        await conn.close()
+
+async def claim_resumable_run_checkpoints():
+    """Забирает прерванные запуски и запуски упавших процессов, помечая их активными."""
+    conn = await asyncpg.connect(DATABASE_URL)
+    try:
+        result = await conn.fetch("""
+            UPDATE run_checkpoints SET status = 'active', updated_at = now()
+            WHERE chat_id IN (
+                SELECT chat_id FROM run_checkpoints
+                WHERE status = 'interrupted' OR updated_at < now() - $1::interval
+                ORDER BY updated_at
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING *
+        """, RUN_CHECKPOINT_LEASE)
+        return [dict(record) for record in result]
+    finally:
+        await conn.close()
+
+async def delete_run_checkpoint(chat_id):
+    """Удаляет прогресс завершенного запуска."""
+    conn = await asyncpg.connect(DATABASE_URL)
+    try:
+        await conn.execute("DELETE FROM run_checkpoints WHERE chat_id = $1", int(chat_id))
+    finally:
+        await conn.close()
@@ -3,6 +3,8 @@ from datetime import datetime, timedelta, timezone
 import pytz
 from cryptography.fernet import Fernet
 from config import base_config
+from hh_json import loads, decode_vacancies, decode_negotiations, decode_resumes
+from tiers import HH_DAILY_RESPONSES_LIMIT
 
 class HHApi:
     """Класс для взаимодействия с API HeadHunter."""
@@ -85,7 +87,7 @@ class HHApi:
         elif response.status_code == 400:
             return 'today_limit'
         elif response.status_code == 403:
-            response_data = response.json()
+            response_data = loads(response.content)
             if self.is_error_present(response_data, "test_required"):
                 return 'test_required'
             elif self.is_error_present(response_data, "already_applied"):
@@ -115,7 +117,7 @@ class HHApi:
         """Получает список резюме пользователя."""
         response = await self.get('/resumes/mine')
         if response.status_code == 200:
-            return response.json().get('items', [])
+            return decode_resumes(response.content)
         else:
             print(f"Failed to retrieve resumes: {response.status_code}")
             return []
@@ -125,7 +127,7 @@ class HHApi:
         params = {'per_page': per_page, 'order_by': 'created_at', 'order': 'desc'}
         response = await self.get('/negotiations', params=params)
         if response.status_code == 200:
-            return response.json().get('items', [])
+            return decode_negotiations(response.content)
         else:
             print(f"Failed to get negotiations: {response.status_code}")
             return None
@@ -139,16 +141,17 @@ class HHApi:
         }
         response = await self.get('/vacancies', params=params)
         if response.status_code == 200:
-            return response.json().get('items', [])
+            return decode_vacancies(response.content)
         else:
             print(f"Failed to retrieve vacancies: {response.status_code}")
             return []
 
-    async def count_remaining_responses(self):
-        """Считает оставшиеся отклики пользователя."""
+    async def count_remaining_responses(self, max_daily_responses=HH_DAILY_RESPONSES_LIMIT):
+        """Считает оставшиеся отклики пользователя с учетом лимита HH и лимита уровня подписки."""
         current_time = datetime.now(timezone.utc)
-        max_daily_responses = 200
-        negotiations = await self.get_negotiations(per_page=max_daily_responses)
+        max_daily_responses = min(max_daily_responses, HH_DAILY_RESPONSES_LIMIT)
+        # Отклики за сутки считаются по полному лимиту HH, даже если у уровня подписки он меньше
+        negotiations = await self.get_negotiations(per_page=HH_DAILY_RESPONSES_LIMIT)
         if negotiations is None:
             return 0, current_time.strftime('%d.%m.%Y %H:%M (%Z)')
         if len(negotiations) == 0:
@@ -168,7 +171,8 @@ class HHApi:
         remaining_responses = max(0, max_daily_responses - used_responses)
 
         if remaining_responses <= 0:
-            next_available_time = responses_last_24_hours[-1] + timedelta(hours=24)
+            # Ждем, пока из суточного окна выйдет столько откликов, чтобы опуститься ниже лимита
+            next_available_time = responses_last_24_hours[used_responses - max_daily_responses] + timedelta(hours=24)
         else:
             next_available_time = current_time
 
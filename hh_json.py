@@ -0,0 +1,78 @@
+import json
+from typing import List, TypedDict
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Схемы содержат только поля, которые читает бот. msgspec декодирует ответ
+# сразу в такие словари и не создает объекты для остальных полей. Без msgspec
+# ответ разбирается целиком, и в словарях остаются все поля.
+
+class Employer(TypedDict, total=False):
+    name: str
+
+class Vacancy(TypedDict, total=False):
+    id: str
+    name: str
+    employer: Employer
+    has_test: bool
+    relations: list
+
+class Negotiation(TypedDict, total=False):
+    created_at: str
+
+class Resume(TypedDict, total=False):
+    id: str
+    title: str
+
+class VacanciesPage(TypedDict, total=False):
+    items: List[Vacancy]
+
+class NegotiationsPage(TypedDict, total=False):
+    items: List[Negotiation]
+
+class ResumesPage(TypedDict, total=False):
+    items: List[Resume]
+
+if msgspec is not None:
+    _decoders = {
+        VacanciesPage: msgspec.json.Decoder(VacanciesPage),
+        NegotiationsPage: msgspec.json.Decoder(NegotiationsPage),
+        ResumesPage: msgspec.json.Decoder(ResumesPage),
+    }
+
+def loads(content):
+    """Разбирает JSON через orjson, если он установлен, иначе через json."""
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+def decode_items(content, schema):
+    """Возвращает список items из ответа API, декодируя только поля схемы."""
+    if msgspec is not None:
+        try:
+            return _decoders[schema].decode(content).get('items', [])
+        except msgspec.ValidationError as e:
+            # Ответ не совпал со схемой: разбираем без нее
+            print(f"Unexpected HH payload, falling back to generic JSON: {e}")
+    # Без msgspec разбираем целиком: копирование только нужных полей обходится дороже, чем экономит
+    return loads(content).get('items', [])
+
+def decode_vacancies(content):
+    """Декодирует страницу вакансий."""
+    return decode_items(content, VacanciesPage)
+
+def decode_negotiations(content):
+    """Декодирует страницу откликов."""
+    return decode_items(content, NegotiationsPage)
+
+def decode_resumes(content):
+    """Декодирует список резюме."""
+    return decode_items(content, ResumesPage)
@@ -1,41 +1,57 @@
 from telegram import InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
 from user_models import UserModel
-from hh import HHApi
+
+# Постоянные клавиатуры создаются один раз: объекты telegram неизменяемы и безопасно переиспользуются
+MAIN_MENU = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🚀 Начать отклики на вакансии", callback_data='start_vacancy_responses')],
+    [InlineKeyboardButton("⚙️ Настройка отклика", callback_data='settings')],
+    [InlineKeyboardButton("📊 Статистика", callback_data='statistics')],
+    [InlineKeyboardButton("ℹ️ О нас", callback_data='about_us')],
+])
+
+UNAUTHORIZED_MAIN_MENU = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🔑 Авторизоваться", callback_data='authorize')],
+    [InlineKeyboardButton("ℹ️ О нас", callback_data='about_us')],
+])
+
+SETTINGS_MENU = InlineKeyboardMarkup([
+    [InlineKeyboardButton("📝 Выбрать резюме для откликов", callback_data='select_resume')],
+    [InlineKeyboardButton("🔍 Обновить ключевые слова для поиска вакансий", callback_data='set_keywords')],
+    [InlineKeyboardButton("💌 Обновить сопроводительное письмо", callback_data='set_cover_letter')],
+    [InlineKeyboardButton("🔧 Текущие настройки", callback_data='view_settings')],
+    [InlineKeyboardButton("🔙 Назад в главное меню", callback_data='main_menu')],
+])
+
+MAIN_MENU_BACK_BUTTON = InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад в главное меню", callback_data='main_menu')]])
+
+SETTINGS_BACK_BUTTON = InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад", callback_data='settings')]])
+
+BROADCAST_CONFIRM_MENU = InlineKeyboardMarkup([
+    [InlineKeyboardButton("✅ Отправить", callback_data='confirm_broadcast')],
+    [InlineKeyboardButton("❌ Отменить", callback_data='cancel_broadcast')],
+])
 
 def build_main_menu(auth_token_exists: bool) -> InlineKeyboardMarkup:
-    """Создает главное меню."""
-    if auth_token_exists:
-        keyboard = [
-            [InlineKeyboardButton("🚀 Начать отклики на вакансии", callback_data='start_vacancy_responses')],
-            [InlineKeyboardButton("⚙️ Настройка отклика", callback_data='settings')],
-            [InlineKeyboardButton("ℹ️ О нас", callback_data='about_us')],
-        ]
-    else:
-        keyboard = [
-            [InlineKeyboardButton("🔑 Авторизоваться", callback_data='authorize')],
-            [InlineKeyboardButton("ℹ️ О нас", callback_data='about_us')],
-        ]
-    return InlineKeyboardMarkup(keyboard)
+    """Возвращает главное меню."""
+    return MAIN_MENU if auth_token_exists else UNAUTHORIZED_MAIN_MENU
 
 
 def build_settings_menu() -> InlineKeyboardMarkup:
-    """Создает меню настроек."""
-    keyboard = [
-        [InlineKeyboardButton("📝 Выбрать резюме для откликов", callback_data='select_resume')],
-        [InlineKeyboardButton("🔍 Обновить ключевые слова для поиска вакансий", callback_data='set_keywords')],
-        [InlineKeyboardButton("💌 Обновить сопроводительное письмо", callback_data='set_cover_letter')],
-        [InlineKeyboardButton("🔧 Текущие настройки", callback_data='view_settings')],
-        [InlineKeyboardButton("🔙 Назад в главное меню", callback_data='main_menu')],
-    ]
-    return InlineKeyboardMarkup(keyboard)
+    """Возвращает меню настроек."""
+    return SETTINGS_MENU
 
 def build_main_menu_back_button() -> InlineKeyboardMarkup:
-    """Создает меню с кнопкой 'Назад' в главное меню."""
-    return InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад в главное меню", callback_data='main_menu')]])
+    """Возвращает меню с кнопкой 'Назад' в главное меню."""
+    return MAIN_MENU_BACK_BUTTON
 
 def build_settings_back_button() -> InlineKeyboardMarkup:
-    """Создает меню с кнопкой 'Назад' в настройки."""
-    return InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад", callback_data='settings')]])
+    """Возвращает меню с кнопкой 'Назад' в настройки."""
+    return SETTINGS_BACK_BUTTON
+
+
+def build_broadcast_confirm_menu() -> InlineKeyboardMarkup:
+    """Возвращает меню подтверждения рассылки."""
+    return BROADCAST_CONFIRM_MENU
 
 
 def build_owner_payment_status_menu(chat_id: int, subscription_level: str) -> InlineKeyboardMarkup:
@@ -64,8 +80,7 @@ def display_about_message():
         "[anvhh-telegram-bot](https://github.com/DaniilKimlb/anvhh-telegram-bot/issues).\n\n"
         "Если у вас возникли вопросы или предложения, свяжитесь с нами через контакт: @scrscrq."
     )
-    reply_markup = InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад в главное меню", callback_data='main_menu')]])
-    return about_message, reply_markup
+    return about_message, MAIN_MENU_BACK_BUTTON
 
 
 def display_current_settings_message(user: UserModel):
@@ -75,11 +90,29 @@ def display_current_settings_message(user: UserModel):
     settings_message += f"🔍 *Ключевые слова*: {user.get('keywords', '❌ Не установлены')}\n"
     settings_message += f"💌 *Сопроводительное письмо*: {'✅ Установлено' if user.get('cover_letter_template') else '❌ Не установлено'}\n"
 
-    reply_markup = InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад", callback_data='settings')]])
-    return settings_message, reply_markup
+    return settings_message, SETTINGS_BACK_BUTTON
+
+def display_statistics_message(stats: dict):
+    """Возвращает текст и клавиатуру со статистикой откликов пользователя."""
+    processed = stats['success'] + stats['already_applied'] + stats['test_required'] + stats['forbidden'] + stats['error']
+    average_response_time = stats['response_time_ms'] / stats['requests'] / 1000 if stats['requests'] else 0
+    statistics_message = "📊 *Статистика откликов*:\n\n"
+    statistics_message += f"✅ *Отправлено сегодня*: {stats['today_success']}\n"
+    statistics_message += f"📅 *За 7 дней*: {stats['week_success']}\n"
+    statistics_message += f"🏆 *Всего*: {stats['success']}\n\n"
+    statistics_message += f"🚀 *Запусков*: {stats['runs']}\n"
+    statistics_message += f"🔎 *Обработано вакансий*: {processed}\n"
+    statistics_message += f"🔁 *Уже был отклик*: {stats['already_applied']}\n"
+    statistics_message += f"📝 *Требовался тест*: {stats['test_required']}\n"
+    statistics_message += f"⛔ *Отклонено HH*: {stats['forbidden']}\n"
+    statistics_message += f"❌ *Ошибок*: {stats['error']}\n"
+    statistics_message += f"⏱ *Среднее время отклика*: {average_response_time:.1f} с\n"
+
+    return statistics_message, MAIN_MENU_BACK_BUTTON
 
 async def display_resume_selection_message(query: CallbackQuery, user: UserModel):
     """Позволяет пользователю выбрать резюме для откликов."""
+    from hh import HHApi
     auth_token = user.get("auth_token")
     hh_api = HHApi(auth_token)
     resume_list = await hh_api.get_resumes()
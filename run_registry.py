@@ -0,0 +1,39 @@
+import asyncio
+
+class RunRegistry:
+    """Учитывает активные запуски откликов процесса и останавливает их при завершении работы."""
+
+    def __init__(self):
+        self.runs = {}
+        self.accepting = True
+        self.stop_requested = False
+
+    def is_running(self, chat_id: int) -> bool:
+        """Проверяет, выполняются ли уже отклики пользователя."""
+        return int(chat_id) in self.runs
+
+    def start(self, chat_id: int, coroutine) -> asyncio.Task:
+        """Запускает отклики пользователя в отдельной задаче."""
+        chat_id = int(chat_id)
+        task = asyncio.create_task(coroutine)
+        self.runs[chat_id] = task
+        task.add_done_callback(lambda _: self.runs.pop(chat_id, None))
+        return task
+
+    async def drain(self, timeout: float) -> None:
+        """Перестает принимать запуски и ждет, пока активные сохранят прогресс. Не успевшие отменяются."""
+        self.accepting = False
+        self.stop_requested = True
+        tasks = list(self.runs.values())
+        if not tasks:
+            return
+        print(f"Waiting for {len(tasks)} active runs to checkpoint")
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            # Отмененные запуски продолжатся с последней сохраненной страницы
+            await asyncio.wait(pending)
+
+
+run_registry = RunRegistry()
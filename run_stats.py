@@ -0,0 +1,59 @@
+from datetime import datetime, timezone
+from config import base_config
+from db import RUN_OUTCOMES, save_run_stats
+
+class RunStats:
+    """Собирает итоги одного запуска откликов."""
+
+    def __init__(self, chat_id: int, run_id: int = None):
+        self.chat_id = int(chat_id)
+        # id уже сохраненной части запуска, если он продолжается после перезапуска
+        self.run_id = run_id
+        self.started_at = datetime.now(timezone.utc)
+        self.counters = dict.fromkeys(RUN_OUTCOMES, 0)
+        self.requests = 0
+        self.response_time_ms = 0
+        self.keep_details = base_config.getRunHistoryDetails()
+        self.details = []
+
+    @property
+    def total(self) -> int:
+        """Количество обработанных вакансий."""
+        return sum(self.counters.values())
+
+    def record(self, vacancy_id, status: str, elapsed: float = None) -> None:
+        """Учитывает результат по вакансии; elapsed — время запроса к HH в секундах, если он был."""
+        if status not in self.counters:
+            return
+        self.counters[status] += 1
+        elapsed_ms = None
+        if elapsed is not None:
+            elapsed_ms = int(elapsed * 1000)
+            self.requests += 1
+            self.response_time_ms += elapsed_ms
+        if self.keep_details:
+            self.details.append((str(vacancy_id), status, elapsed_ms, datetime.now(timezone.utc)))
+
+    async def save(self):
+        """Сохраняет накопленные итоги запуска, если было что учитывать. Возвращает id запуска."""
+        if self.total == 0:
+            return self.run_id
+        try:
+            self.run_id = await save_run_stats(
+                self.chat_id,
+                self.started_at,
+                datetime.now(timezone.utc),
+                self.counters,
+                self.requests,
+                self.response_time_ms,
+                self.details,
+                self.run_id,
+            )
+            # Сохраненное не учитываем повторно, если save вызовут еще раз
+            self.counters = dict.fromkeys(RUN_OUTCOMES, 0)
+            self.requests = 0
+            self.response_time_ms = 0
+            self.details = []
+        except Exception as e:
+            print(e, 'error in saving run stats')
+        return self.run_id
@@ -0,0 +1,111 @@
+import asyncio
+import heapq
+import itertools
+import json
+from contextlib import asynccontextmanager
+from config import base_config
+
+DEFAULT_TIER = 'free'
+# Суточный лимит откликов HH на одного соискателя, уровень подписки не может его превышать
+HH_DAILY_RESPONSES_LIMIT = 200
+
+# Значения по умолчанию; переопределяются JSON-объектом в переменной SUBSCRIPTION_TIERS
+DEFAULT_TIERS_CONFIG = {
+    'free': {'priority': 2, 'max_concurrency': 1, 'daily_responses': 200},
+    'basic': {'priority': 1, 'max_concurrency': 3, 'daily_responses': 200},
+    'premium': {'priority': 0, 'max_concurrency': 5, 'daily_responses': 200},
+}
+
+class SubscriptionTier:
+    """Ограничения уровня подписки. Меньшее значение priority обслуживается раньше."""
+
+    def __init__(self, name: str, priority: int, max_concurrency: int, daily_responses: int):
+        self.name = name
+        self.priority = priority
+        self.max_concurrency = max(1, max_concurrency)
+        self.daily_responses = min(HH_DAILY_RESPONSES_LIMIT, max(1, daily_responses))
+
+
+def build_subscription_tiers(tiers_config: dict) -> dict:
+    """Создает уровни подписки, дополняя поля каждого уровня значениями по умолчанию."""
+    default_params = DEFAULT_TIERS_CONFIG[DEFAULT_TIER]
+    tiers = {}
+    for name in {**DEFAULT_TIERS_CONFIG, **tiers_config}:
+        unknown_keys = set(tiers_config.get(name, {})) - set(default_params)
+        if unknown_keys:
+            raise ValueError(f"unknown fields {sorted(unknown_keys)} in tier '{name}'")
+        params = {**default_params, **DEFAULT_TIERS_CONFIG.get(name, {}), **tiers_config.get(name, {})}
+        tiers[name] = SubscriptionTier(
+            name,
+            priority=int(params['priority']),
+            max_concurrency=int(params['max_concurrency']),
+            daily_responses=int(params['daily_responses']),
+        )
+    return tiers
+
+def load_subscription_tiers() -> dict:
+    """Загружает конфигурацию уровней подписки."""
+    raw_config = base_config.getSubscriptionTiers()
+    if raw_config:
+        try:
+            return build_subscription_tiers(json.loads(raw_config))
+        except (ValueError, TypeError, AttributeError) as e:
+            print(f"Invalid SUBSCRIPTION_TIERS, using defaults: {e}")
+    return build_subscription_tiers({})
+
+# Загружается один раз при импорте и дальше читается только из памяти
+subscription_tiers = load_subscription_tiers()
+
+def get_tier(subscription_level) -> SubscriptionTier:
+    """Возвращает уровень подписки пользователя, неизвестные уровни считаются бесплатными."""
+    return subscription_tiers.get(subscription_level) or subscription_tiers[DEFAULT_TIER]
+
+
+class RunQueue:
+    """Ограничивает число одновременных запусков откликов и пропускает ожидающих по приоритету."""
+
+    def __init__(self, max_active_runs: int):
+        self.max_active_runs = max_active_runs
+        self.active_runs = 0
+        self.waiters = []
+        self.counter = itertools.count()
+
+    def is_full(self) -> bool:
+        """Проверяет, придется ли новому запуску ждать в очереди."""
+        return self.active_runs >= self.max_active_runs
+
+    async def acquire(self, priority: int) -> None:
+        """Занимает слот запуска, при нехватке ждет своей очереди."""
+        if not self.is_full() and not self.waiters:
+            self.active_runs += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiters, (priority, next(self.counter), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Слот уже передан этой задаче, возвращаем его следующему
+                self.release()
+            raise
+
+    def release(self) -> None:
+        """Освобождает слот и передает его ожидающему с наивысшим приоритетом."""
+        while self.waiters:
+            _, _, future = heapq.heappop(self.waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active_runs -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority: int):
+        """Контекстный менеджер для слота запуска."""
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+run_queue = RunQueue(base_config.getMaxActiveRuns())
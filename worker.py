@@ -0,0 +1,148 @@
+import argparse
+import asyncio
+import signal
+import asyncpg
+from telegram import Bot
+from config import base_config
+from db import (
+    DATABASE_URL,
+    RESPONSE_JOBS_CHANNEL,
+    create_tables,
+    claim_response_job,
+    finish_response_job,
+    requeue_response_job,
+    touch_response_jobs,
+    load_run_checkpoint,
+)
+from user_models import UserModel
+from api_services import ChatMessage, RUN_INTERRUPTED, begin_vacancy_responses
+from run_registry import run_registry
+
+# Интервал опроса очереди на случай потерянного уведомления LISTEN/NOTIFY
+POLL_INTERVAL = 30
+# Интервал продления аренды задач, должен быть заметно меньше RESPONSE_JOB_LEASE
+HEARTBEAT_INTERVAL = 30
+
+# Задачи, которые выполняет этот воркер
+active_job_ids = set()
+
+async def run_job(bot: Bot, job: dict) -> None:
+    """Выполняет задачу откликов для одного пользователя."""
+    query = ChatMessage(bot, job['chat_id'], job['message_id'])
+    status = 'done'
+    active_job_ids.add(job['id'])
+    try:
+        user = UserModel(job['chat_id'])
+        await user.load(use_cache=False)
+        # Задача могла быть прервана остановкой или падением другого воркера
+        checkpoint = await load_run_checkpoint(job['chat_id'])
+        result = await begin_vacancy_responses(
+            query,
+            None,
+            chat_id=job['chat_id'],
+            auth_token=user.get("auth_token"),
+            resume_id=user.get("resume_id"),
+            keywords=user.get('keywords'),
+            cover_letter_template=user.get('cover_letter_template'),
+            subscription_level=user.get('subscription_level'),
+            checkpoint=checkpoint,
+        )
+        if result == RUN_INTERRUPTED:
+            status = 'pending'
+    except asyncio.CancelledError:
+        await requeue_response_job(job['id'])
+        raise
+    except Exception as e:
+        print(e, 'error in response job', job['id'])
+        status = 'failed'
+    finally:
+        active_job_ids.discard(job['id'])
+    if status == 'pending':
+        await requeue_response_job(job['id'])
+    else:
+        await finish_response_job(job['id'], status)
+
+async def send_heartbeats() -> None:
+    """Периодически продлевает аренду выполняемых задач, чтобы их не забрал другой воркер."""
+    while True:
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+        if not active_job_ids:
+            continue
+        try:
+            await touch_response_jobs(active_job_ids)
+        except Exception as e:
+            print(e, 'error in sending heartbeats')
+
+async def claim_jobs(bot: Bot, shard: int, concurrency: int, wakeup: asyncio.Event, shutdown: asyncio.Event) -> None:
+    """Забирает задачи шарда из очереди, пока воркер не начнет останавливаться."""
+    semaphore = asyncio.Semaphore(concurrency)
+    while not shutdown.is_set():
+        await semaphore.acquire()
+        if shutdown.is_set():
+            semaphore.release()
+            break
+        wakeup.clear()
+        try:
+            job = await claim_response_job(shard)
+        except Exception as e:
+            print(e, 'error in claiming response job')
+            job = None
+        if job is None:
+            semaphore.release()
+            try:
+                await asyncio.wait_for(wakeup.wait(), POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        task = run_registry.start(job['chat_id'], run_job(bot, job))
+        task.add_done_callback(lambda _: semaphore.release())
+
+async def run_worker(shard: int, shards: int, concurrency: int) -> None:
+    """Забирает задачи своего шарда из очереди и выполняет их параллельно."""
+    await create_tables()
+    wakeup = asyncio.Event()
+    shutdown = asyncio.Event()
+
+    def on_notify(connection, pid, channel, payload):
+        if payload == str(shard):
+            wakeup.set()
+
+    def on_shutdown():
+        shutdown.set()
+        wakeup.set()
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, on_shutdown)
+
+    listener = await asyncpg.connect(DATABASE_URL)
+    await listener.add_listener(RESPONSE_JOBS_CHANNEL, on_notify)
+    print(f"Worker started: shard {shard} of {shards}, concurrency {concurrency}")
+    try:
+        async with Bot(base_config.getBotToken()) as bot:
+            heartbeat_task = asyncio.create_task(send_heartbeats())
+            claim_task = asyncio.create_task(claim_jobs(bot, shard, concurrency, wakeup, shutdown))
+            shutdown_task = asyncio.create_task(shutdown.wait())
+            await asyncio.wait({claim_task, shutdown_task}, return_when=asyncio.FIRST_COMPLETED)
+            print("Worker is shutting down")
+            on_shutdown()
+            # Активные задачи сохраняют прогресс и возвращаются в очередь
+            await run_registry.drain(base_config.getShutdownTimeout())
+            await claim_task
+            heartbeat_task.cancel()
+    finally:
+        await listener.close()
+
+def main() -> None:
+    """Запускает процесс-воркер, выполняющий отклики для своего шарда пользователей."""
+    parser = argparse.ArgumentParser(description="ANVHH response worker")
+    parser.add_argument('--shard', type=int, default=base_config.getWorkerShard())
+    parser.add_argument('--shards', type=int, default=base_config.getWorkerShards())
+    parser.add_argument('--concurrency', type=int, default=base_config.getWorkerConcurrency())
+    args = parser.parse_args()
+    if args.shards <= 0 or not 0 <= args.shard < args.shards:
+        parser.error("shard must be in range [0, shards) and WORKER_SHARDS must be positive")
+    asyncio.run(run_worker(args.shard, args.shards, args.concurrency))
+
+if __name__ == '__main__':
+    main()